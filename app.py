@@ -1,130 +1,342 @@
-from flask import Flask, render_template, request, jsonify, Response
-import json
+from quart import Quart, render_template, request, jsonify, Response
+import asyncio
+import logging
+import orjson
+import os
+import threading
 import time
-from threading import Thread
-import queue
+from collections import deque
 from config import validate_config, GITHUB_REPO, RAILWAY_PROJECT_ID
 from deepseek_client import DeepSeekClient
 from github_manager import GitHubManager
 from railway_manager import RailwayManager
 
-app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
-# Global queue for Server-Sent Events
-message_queue = queue.Queue()
+app = Quart(__name__)
 
-def send_update(message_type, content):
+# Lazy singletons: constructing a client builds an HTTP session, so keep
+# one per API and reuse its connection pool across submissions
+_deepseek = None
+_github = None
+_railway = None
+_clients_lock = threading.Lock()
+
+def get_deepseek():
+    global _deepseek
+    with _clients_lock:
+        if _deepseek is None:
+            _deepseek = DeepSeekClient()
+    return _deepseek
+
+def get_github():
+    global _github
+    with _clients_lock:
+        if _github is None:
+            _github = GitHubManager()
+    return _github
+
+def get_railway():
+    global _railway
+    with _clients_lock:
+        if _railway is None:
+            _railway = RailwayManager()
+    return _railway
+
+class MessageAnnouncer:
+    """Fan-out pub/sub for SSE: each listener gets its own queue.
+
+    announce() copies the event to every listener, so concurrent
+    dashboards no longer steal each other's events from a shared queue.
+    Listeners that stop draining (stalled tabs) are dropped once their
+    queue fills up.
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self.dropped_events = 0
+
+    def listen(self):
+        q = asyncio.Queue(maxsize=100)
+        self.listeners.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        """Remove a listener queue; harmless if announce() already
+        dropped it as a wedged consumer."""
+        try:
+            self.listeners.remove(q)
+        except ValueError:
+            pass
+
+    def announce(self, msg):
+        for i in reversed(range(len(self.listeners))):
+            q = self.listeners[i]
+            try:
+                q.put_nowait(msg)
+            except asyncio.QueueFull:
+                # Slow consumer: discard its oldest event to make room so
+                # a stalled tab can't grow memory or wedge the producer
+                self.dropped_events += 1
+                try:
+                    q.get_nowait()
+                    q.put_nowait(msg)
+                except (asyncio.QueueEmpty, asyncio.QueueFull):
+                    del self.listeners[i]
+
+announcer = MessageAnnouncer()
+
+# Coalesce bursts of events (e.g. a large MULTIPLE_OPERATIONS batch) into
+# one SSE frame per window instead of one frame per log line
+BATCH_WINDOW_MS = int(os.getenv("BATCH_WINDOW_MS", "50"))
+
+# Types that must reach the client immediately, bypassing the debounce
+_IMMEDIATE_TYPES = {"error", "complete"}
+
+_pending_events = deque()
+_flush_task = None
+
+def _flush_pending():
+    """Emit everything queued in the current batch window"""
+    if not _pending_events:
+        return
+    if len(_pending_events) == 1:
+        announcer.announce(_pending_events.popleft())
+    else:
+        events = list(_pending_events)
+        _pending_events.clear()
+        announcer.announce({
+            "type": "batch",
+            "events": events,
+            "timestamp": time.time()
+        })
+
+async def _flush_after_window():
+    global _flush_task
+    await asyncio.sleep(BATCH_WINDOW_MS / 1000)
+    _flush_task = None
+    _flush_pending()
+
+async def send_update(message_type, content):
     """Send an update to the frontend via SSE"""
+    global _flush_task
     message = {
         "type": message_type,
         "content": content,
         "timestamp": time.time()
     }
-    message_queue.put(message)
-    print(f"[{message_type}] {content}")
+    # Deferred %s formatting: when DEBUG is off this doesn't even format,
+    # and there's no per-event stdout lock contention on bursts
+    logger.debug("[%s] %s", message_type, content)
+
+    _pending_events.append(message)
+    if message_type in _IMMEDIATE_TYPES:
+        # Flush now so errors/completion aren't delayed behind the window
+        if _flush_task is not None:
+            _flush_task.cancel()
+            _flush_task = None
+        _flush_pending()
+    elif _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_after_window())
+
+# Events set by the webhook routes below; when GitHub/Railway webhooks are
+# pointed at this app, the workflow unblocks as soon as the push/deployment
+# is seen instead of sleeping a fixed interval. Without webhooks the waits
+# simply time out and behave like the old hard-coded sleeps.
+github_push_event = asyncio.Event()
+railway_deploy_event = asyncio.Event()
 
-def process_user_request(user_request):
+# Only one workflow is meaningful at a time: a new submit cancels the
+# previous worker at safe checkpoints (between steps, never mid-write)
+current_worker = {"task": None, "cancel": asyncio.Event()}
+
+async def _wait_for_event(event, timeout):
+    """Wait for a webhook event, falling back to a fixed delay on timeout"""
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+async def process_user_request(user_request, cancel=None):
     """Main workflow: DeepSeek -> GitHub -> Railway -> Verification"""
+
+    def checkpoint():
+        # Safe preemption points: only ever between steps, so a cancelled
+        # worker never stops mid-GitHub-write
+        if cancel is not None and cancel.is_set():
+            raise RuntimeError("cancelled")
+
     try:
-        send_update("status", "Initializing...")
-        
-        # Initialize clients
-        deepseek = DeepSeekClient()
-        github = GitHubManager()
-        railway = RailwayManager()
-        
+        await send_update("status", "Initializing...")
+
+        # Reuse the long-lived clients; only the conversation state is
+        # reset so sessions' keep-alive connections survive across requests
+        deepseek = get_deepseek()
+        github = get_github()
+        railway = get_railway()
+        deepseek.reset_conversation()
+
+        # DeepSeek calls run in a worker thread; forward streamed tokens
+        # back onto the event loop so the UI renders them as they arrive
+        loop = asyncio.get_running_loop()
+
+        def forward_delta(delta):
+            asyncio.run_coroutine_threadsafe(send_update("deepseek_delta", delta), loop)
+
         # Step 1: Get current codebase
-        send_update("status", "Fetching current codebase from GitHub...")
-        codebase = github.format_codebase_for_prompt()
-        send_update("codebase", codebase)
-        
+        checkpoint()
+        await send_update("status", "Fetching current codebase from GitHub...")
+        codebase = await asyncio.to_thread(github.format_codebase_for_prompt)
+        await send_update("codebase", codebase)
+
         # Step 2: Send request to DeepSeek
-        send_update("status", "Sending request to DeepSeek...")
-        response = deepseek.chat(user_request, codebase)
-        send_update("deepseek_response", response)
-        
+        checkpoint()
+        await send_update("status", "Sending request to DeepSeek...")
+        response = await asyncio.to_thread(deepseek.chat, user_request, codebase, on_delta=forward_delta)
+        await send_update("deepseek_response", response)
+
         # Step 3: Parse operations
         operations = deepseek.parse_operations(response)
-        
+
         if not operations:
-            send_update("status", "DeepSeek provided a conversational response (no code operations)")
-            send_update("complete", "Process complete - no code changes requested")
+            await send_update("status", "DeepSeek provided a conversational response (no code operations)")
+            await send_update("complete", "Process complete - no code changes requested")
             return
-        
+
         # Step 4: Apply operations to GitHub
-        send_update("status", f"Applying {len(operations)} operations to GitHub...")
-        
+        checkpoint()
+        await send_update("status", f"Applying {len(operations)} operations to GitHub...")
+
+        # Special operations are handled here, in order, so early-return
+        # semantics are preserved before any file work is dispatched
+        file_ops = []
+        auto_verified = False
         for i, operation in enumerate(operations, 1):
             op_type = operation.get("operation")
-            
-            # Check for special operations
+
             if op_type == "VERIFY_COMPLETE":
-                send_update("status", "DeepSeek verified code is complete!")
-                send_update("complete", operation.get("message", "Code verified"))
-                return
-            
+                if len(operations) == 1:
+                    await send_update("status", "DeepSeek verified code is complete!")
+                    await send_update("complete", operation.get("message", "Code verified"))
+                    return
+                # VERIFY_COMPLETE alongside file operations means DeepSeek
+                # pre-verified its own output - skip the verification turn
+                auto_verified = True
+                continue
+
             if op_type == "NEEDS_RETRY":
-                send_update("error", f"DeepSeek found issues: {operation.get('message')}")
+                await send_update("error", f"DeepSeek found issues: {operation.get('message')}")
                 continue
-            
-            # Apply the operation
-            try:
-                send_update("operation", f"[{i}/{len(operations)}] {op_type}: {operation.get('path', 'N/A')}")
-                github.apply_operation(operation)
-                send_update("operation_success", f"Successfully applied {op_type}")
-            except Exception as e:
-                send_update("error", f"Failed to apply {op_type}: {str(e)}")
-                return
-        
-        # Step 5: Get updated codebase for verification
-        send_update("status", "Getting updated codebase for verification...")
-        time.sleep(2)  # Give GitHub a moment to sync
-        updated_codebase = github.format_codebase_for_prompt()
-        
-        # Step 6: Ask DeepSeek to verify the changes
-        send_update("status", "Asking DeepSeek to verify the changes...")
-        verification_response = deepseek.chat(
-            "Please verify the above codebase is correct. If everything looks good, respond with VERIFY_COMPLETE operation. If there are issues, respond with NEEDS_RETRY operation with fixes.",
-            updated_codebase
-        )
-        send_update("deepseek_response", verification_response)
-        
-        # Parse verification response
-        verification_ops = deepseek.parse_operations(verification_response)
-        
-        # Check if verification passed
-        if verification_ops and verification_ops[0].get("operation") == "VERIFY_COMPLETE":
-            send_update("status", "✓ DeepSeek verified the code!")
+
+            if op_type == "MULTIPLE_OPERATIONS":
+                # The wrapper shape carries the same conversational
+                # entries nested (the prompt encourages a trailing
+                # VERIFY_COMPLETE inside the list); strip them here so
+                # the batch only ever sees file work
+                kept = []
+                for sub in operation.get("operations", []):
+                    sub_type = sub.get("operation")
+                    if sub_type == "VERIFY_COMPLETE":
+                        auto_verified = True
+                    elif sub_type == "NEEDS_RETRY":
+                        await send_update("error", f"DeepSeek found issues: {sub.get('message')}")
+                    else:
+                        kept.append(sub)
+                if not kept:
+                    continue
+                operation = {**operation, "operations": kept}
+
+            file_ops.append((i, operation))
+
+        # Arm the webhook events before pushing so notifications that race
+        # the apply step aren't missed
+        github_push_event.clear()
+        railway_deploy_event.clear()
+
+        # Concurrent contents-API commits race on the branch ref (GitHub
+        # answers parallel updates with 409 Conflict even across distinct
+        # paths), so a multi-operation batch lands as one Git Data API
+        # commit - apply_batch parallelizes the blob uploads internally
+        try:
+            if len(file_ops) > 1:
+                for i, operation in file_ops:
+                    await send_update("operation", f"[{i}/{len(operations)}] {operation.get('operation')}: {operation.get('path', 'N/A')}")
+                ops = [operation for _, operation in file_ops]
+                await asyncio.to_thread(github.apply_batch, ops)
+                await send_update("operation_success", f"Applied {len(ops)} operations in one commit")
+            elif file_ops:
+                i, operation = file_ops[0]
+                op_type = operation.get("operation")
+                await send_update("operation", f"[{i}/{len(operations)}] {op_type}: {operation.get('path', 'N/A')}")
+                await asyncio.to_thread(github.apply_operation, operation)
+                await send_update("operation_success", f"Successfully applied {op_type}")
+        except Exception as e:
+            await send_update("error", f"Failed to apply operation: {str(e)}")
+            return
+
+        # Step 5: Ask DeepSeek to verify the changes (skipped when the
+        # first response already carried an inline VERIFY_COMPLETE).
+        checkpoint()
+        if auto_verified:
+            await send_update("status", "✓ DeepSeek pre-verified its operations - skipping verification call")
         else:
-            send_update("warning", "DeepSeek requested changes - applying fixes...")
-            # Recursively apply fixes (limit recursion)
-            if verification_ops:
-                for operation in verification_ops:
-                    if operation.get("operation") not in ["VERIFY_COMPLETE", "NEEDS_RETRY"]:
-                        try:
-                            github.apply_operation(operation)
-                            send_update("operation_success", f"Applied fix: {operation.get('operation')}")
-                        except Exception as e:
-                            send_update("error", f"Failed to apply fix: {str(e)}")
-        
+            # The conversation already contains the codebase and the
+            # operations just applied, so we reuse the seeded system message
+            # instead of re-sending the whole tree (saves a large prompt).
+            await send_update("status", "Asking DeepSeek to verify the changes...")
+            verification_response = await asyncio.to_thread(
+                deepseek.chat,
+                "Please verify the above codebase is correct. If everything looks good, respond with VERIFY_COMPLETE operation. If there are issues, respond with NEEDS_RETRY operation with fixes.",
+                on_delta=forward_delta
+            )
+            await send_update("deepseek_response", verification_response)
+
+            # Parse verification response
+            verification_ops = deepseek.parse_operations(verification_response)
+
+            # Check if verification passed
+            if verification_ops and verification_ops[0].get("operation") == "VERIFY_COMPLETE":
+                await send_update("status", "✓ DeepSeek verified the code!")
+            else:
+                await send_update("warning", "DeepSeek requested changes - applying fixes...")
+                # Recursively apply fixes (limit recursion)
+                if verification_ops:
+                    for operation in verification_ops:
+                        if operation.get("operation") not in ["VERIFY_COMPLETE", "NEEDS_RETRY"]:
+                            try:
+                                await asyncio.to_thread(github.apply_operation, operation)
+                                await send_update("operation_success", f"Applied fix: {operation.get('operation')}")
+                            except Exception as e:
+                                await send_update("error", f"Failed to apply fix: {str(e)}")
+
         # Step 7: Wait for Railway deployment
-        send_update("status", "Waiting for Railway deployment...")
-        send_update("deployment", "Deployment started (monitoring...)")
-        
-        # Note: Railway may take a moment to detect the GitHub push
-        time.sleep(5)
-        
-        status, logs, deployment_id = railway.wait_for_deployment()
-        
-        send_update("deployment", f"Deployment status: {status}")
-        send_update("logs", "\n".join(logs))
-        
+        checkpoint()
+        await send_update("status", "Waiting for Railway deployment...")
+        await send_update("deployment", "Deployment started (monitoring...)")
+
+        # The GitHub push webhook confirms our API commit has propagated
+        # (the gap the old fixed sleep papered over); Railway's webhook
+        # then fires once it picks the push up. Either wait unblocks
+        # immediately when the webhook arrives and otherwise falls back
+        # to the short fixed delay.
+        if await _wait_for_event(github_push_event, timeout=3):
+            await send_update("status", "GitHub webhook received - push propagated")
+        if await _wait_for_event(railway_deploy_event, timeout=5):
+            await send_update("status", "Railway webhook received - deployment detected")
+
+        status, logs, deployment_id = await railway.wait_for_deployment_async()
+
+        await send_update("deployment", f"Deployment status: {status}")
+        await send_update("logs", "\n".join(logs))
+
         # Step 8: Send deployment results to DeepSeek for evaluation
+        checkpoint()
         if status == "SUCCESS":
-            send_update("status", "Deployment successful! Sending logs to DeepSeek for final evaluation...")
-            
+            await send_update("status", "Deployment successful! Sending logs to DeepSeek for final evaluation...")
+
             evaluation_prompt = f"""The code has been successfully deployed to Railway.
-            
+
 Deployment Status: {status}
 Deployment ID: {deployment_id}
 
@@ -132,106 +344,167 @@ Deployment Logs:
 {railway.format_logs_for_prompt(logs)}
 
 Please review the deployment logs and confirm if the application is running correctly and doing what was intended. If there are any errors or issues, provide fixes using the operation format."""
-            
-            evaluation_response = deepseek.chat(evaluation_prompt)
-            send_update("deepseek_response", evaluation_response)
-            
+
+            evaluation_response = await asyncio.to_thread(deepseek.chat, evaluation_prompt, on_delta=forward_delta)
+            await send_update("deepseek_response", evaluation_response)
+
             # Check if DeepSeek is satisfied
             eval_ops = deepseek.parse_operations(evaluation_response)
-            
+
             if eval_ops and eval_ops[0].get("operation") == "VERIFY_COMPLETE":
-                send_update("complete", "✓ Success! DeepSeek confirmed the script is running correctly.")
+                await send_update("complete", "✓ Success! DeepSeek confirmed the script is running correctly.")
             else:
-                send_update("warning", "DeepSeek found issues in deployment. Check the response above.")
-        
+                await send_update("warning", "DeepSeek found issues in deployment. Check the response above.")
+
         elif status in ["FAILED", "CRASHED"]:
-            send_update("status", "Deployment failed! Sending error logs to DeepSeek...")
-            
+            await send_update("status", "Deployment failed! Sending error logs to DeepSeek...")
+
             error_prompt = f"""The deployment FAILED with status: {status}
 
 Deployment Logs:
 {railway.format_logs_for_prompt(logs)}
 
 Please analyze the error and provide fixes using the operation format to correct the issues."""
-            
-            error_response = deepseek.chat(error_prompt)
-            send_update("deepseek_response", error_response)
-            
+
+            error_response = await asyncio.to_thread(deepseek.chat, error_prompt, on_delta=forward_delta)
+            await send_update("deepseek_response", error_response)
+
             # Apply fixes if provided
             error_ops = deepseek.parse_operations(error_response)
             if error_ops:
-                send_update("status", "Applying DeepSeek's fixes...")
+                await send_update("status", "Applying DeepSeek's fixes...")
                 for operation in error_ops:
                     if operation.get("operation") not in ["VERIFY_COMPLETE", "NEEDS_RETRY"]:
                         try:
-                            github.apply_operation(operation)
-                            send_update("operation_success", f"Applied fix: {operation.get('operation')}")
+                            await asyncio.to_thread(github.apply_operation, operation)
+                            await send_update("operation_success", f"Applied fix: {operation.get('operation')}")
                         except Exception as e:
-                            send_update("error", f"Failed to apply fix: {str(e)}")
-                
-                send_update("status", "Fixes applied. Waiting for new deployment...")
+                            await send_update("error", f"Failed to apply fix: {str(e)}")
+
+                await send_update("status", "Fixes applied. Waiting for new deployment...")
                 # Wait for the new deployment
-                time.sleep(5)
-                status, logs, deployment_id = railway.wait_for_deployment()
-                send_update("deployment", f"Retry deployment status: {status}")
-                send_update("logs", "\n".join(logs))
-        
+                railway_deploy_event.clear()
+                await _wait_for_event(railway_deploy_event, timeout=5)
+                status, logs, deployment_id = await railway.wait_for_deployment_async()
+                await send_update("deployment", f"Retry deployment status: {status}")
+                await send_update("logs", "\n".join(logs))
+
         else:
-            send_update("error", f"Deployment status: {status}")
-        
-        send_update("complete", "Process finished")
-        
+            await send_update("error", f"Deployment status: {status}")
+
+        await send_update("complete", "Process finished")
+
+    except RuntimeError as e:
+        if str(e) == "cancelled":
+            await send_update("warning", "Superseded by a newer request - stopping this run")
+            return
+        await send_update("error", f"Fatal error: {str(e)}")
+        await send_update("complete", "Process terminated with errors")
     except Exception as e:
-        send_update("error", f"Fatal error: {str(e)}")
-        send_update("complete", "Process terminated with errors")
+        await send_update("error", f"Fatal error: {str(e)}")
+        await send_update("complete", "Process terminated with errors")
 
 @app.route('/')
-def index():
+async def index():
     """Render the main UI"""
-    return render_template('index.html', repo=GITHUB_REPO, project_id=RAILWAY_PROJECT_ID)
+    return await render_template('index.html', repo=GITHUB_REPO, project_id=RAILWAY_PROJECT_ID)
 
 @app.route('/api/submit', methods=['POST'])
-def submit_request():
+async def submit_request():
     """Handle user request submission"""
-    data = request.json
+    data = await request.get_json()
     user_request = data.get('request', '')
-    
+
     if not user_request:
         return jsonify({"error": "No request provided"}), 400
-    
-    # Clear the message queue
-    while not message_queue.empty():
-        message_queue.get()
-    
-    # Process request in background thread
-    thread = Thread(target=process_user_request, args=(user_request,))
-    thread.daemon = True
-    thread.start()
-    
+
+    # Cancel any in-flight worker so two submissions don't interleave
+    # events or waste model/API calls on a stale request
+    current_worker["cancel"].set()
+    cancel = asyncio.Event()
+    current_worker["cancel"] = cancel
+
+    # Process request on the event loop (no worker thread needed)
+    current_worker["task"] = asyncio.create_task(process_user_request(user_request, cancel))
+
     return jsonify({"status": "started"})
 
+@app.route('/api/diagnostics')
+async def diagnostics():
+    """Expose SSE delivery health for debugging stalled dashboards"""
+    return jsonify({
+        "listeners": len(announcer.listeners),
+        "dropped_events": announcer.dropped_events,
+        "pending_batch": len(_pending_events)
+    })
+
+@app.route('/webhook/github', methods=['POST'])
+async def github_webhook():
+    """GitHub push webhook - signals that the push has propagated"""
+    await request.get_json(silent=True)
+    github_push_event.set()
+    return jsonify({"status": "ok"})
+
+@app.route('/webhook/railway', methods=['POST'])
+async def railway_webhook():
+    """Railway deployment webhook - signals that a deployment was triggered"""
+    payload = await request.get_json(silent=True)
+    railway_deploy_event.set()
+    # Wake any in-flight wait_for_deployment so it re-polls immediately
+    get_railway().notify_deployment(payload)
+    return jsonify({"status": "ok"})
+
 @app.route('/api/stream')
-def stream():
+async def stream():
     """Server-Sent Events stream for real-time updates"""
-    def event_stream():
-        while True:
-            try:
-                message = message_queue.get(timeout=30)
-                yield f"data: {json.dumps(message)}\n\n"
-            except queue.Empty:
-                # Send keepalive
-                yield f"data: {json.dumps({'type': 'keepalive'})}\n\n"
-    
-    return Response(event_stream(), mimetype="text/event-stream")
+    async def event_stream():
+        q = announcer.listen()
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(q.get(), timeout=30)
+                    yield b"data: " + orjson.dumps(message) + b"\n\n"
+                except asyncio.TimeoutError:
+                    # Send keepalive
+                    yield b'data: {"type": "keepalive"}\n\n'
+        finally:
+            # Generator is closed when the client disconnects; without
+            # this every departed client would leak a queue that
+            # announce() keeps filling forever
+            announcer.unsubscribe(q)
+
+    response = Response(event_stream(), mimetype="text/event-stream")
+    # Quart wraps the response send in wait_for(RESPONSE_TIMEOUT) (60s by
+    # default), which would tear down every SSE connection after a minute;
+    # streams are meant to live for the whole workflow
+    response.timeout = None
+    return response
 
 if __name__ == '__main__':
     try:
+        logging.basicConfig(
+            level=logging.INFO if os.getenv("FLASK_ENV") == "production" else logging.DEBUG
+        )
         validate_config()
         print("Configuration validated successfully!")
         print(f"GitHub Repo: {GITHUB_REPO}")
         print(f"Railway Project: {RAILWAY_PROJECT_ID}")
         print("\nStarting server on http://localhost:5000")
-        app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
+
+        if os.getenv("QUART_ENV", os.getenv("FLASK_ENV", "")) == "development":
+            # Dev server with reloader/debugger; never use this for real
+            # traffic - the debug middleware slows every request
+            app.run(debug=True, host='0.0.0.0', port=5000)
+        else:
+            # Hypercorn multiplexes all SSE clients on one event loop;
+            # the stream response itself opts out of Quart's response
+            # timeout above
+            from hypercorn.config import Config
+            from hypercorn.asyncio import serve
+
+            config = Config()
+            config.bind = ["0.0.0.0:5000"]
+            asyncio.run(serve(app, config))
     except ValueError as e:
         print(f"Configuration error: {str(e)}")
         exit(1)
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 
+# Module import runs once per process, so .env is only read here
 load_dotenv()
 
 # Repository Configuration (EDIT THESE)
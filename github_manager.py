@@ -1,7 +1,63 @@
 import requests
 import base64
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import GITHUB_TOKEN, GITHUB_API_URL, GITHUB_REPO, DEFAULT_BRANCH
 
+def _git_blob_sha(content):
+    """GitHub's blob SHA for `content` (bytes), computed locally.
+
+    Matching it against a known file SHA detects byte-identical writes
+    before any network call is made.
+    """
+    return hashlib.sha1(b"blob %d\0%s" % (len(content), content)).hexdigest()
+
+def _nth_newline_offset(text, n):
+    """Offset just past the nth newline (0 -> start of text).
+
+    Lets line edits slice the raw string once instead of splitting the
+    whole file into per-line objects and re-joining.
+    """
+    pos = 0
+    for _ in range(n):
+        pos = text.find("\n", pos) + 1
+    return pos
+
+def _insert_into(existing, line_number, content):
+    """Return `existing` with `content` inserted before `line_number`"""
+    line_count = existing.count("\n") + 1
+
+    if line_number < 1 or line_number > line_count + 1:
+        raise Exception(f"Invalid line number {line_number}. File has {line_count} lines.")
+
+    # Insert with a single slice concatenation - no per-line list churn
+    if line_number == line_count + 1:
+        return existing + "\n" + content
+    off = _nth_newline_offset(existing, line_number - 1)
+    if not content.endswith("\n"):
+        content += "\n"
+    return existing[:off] + content + existing[off:]
+
+def _delete_from(existing, start_line, end_line):
+    """Return `existing` with lines start_line..end_line (inclusive) removed"""
+    line_count = existing.count("\n") + 1
+
+    if start_line < 1 or end_line > line_count or start_line > end_line:
+        raise Exception(
+            f"Invalid line range {start_line}-{end_line}. File has {line_count} lines."
+        )
+
+    # Slice the deleted span out in one concatenation
+    start_off = _nth_newline_offset(existing, start_line - 1)
+    if end_line == line_count:
+        # No newline terminates the last line; drop the one before it too
+        return existing[:max(start_off - 1, 0)]
+    end_off = _nth_newline_offset(existing, end_line)
+    return existing[:start_off] + existing[end_off:]
+
 class GitHubManager:
     def __init__(self):
         self.token = GITHUB_TOKEN
@@ -12,80 +68,182 @@ class GitHubManager:
             "Authorization": f"token {self.token}",
             "Accept": "application/vnd.github.v3+json"
         }
+        # In-memory mirror of the repo, kept in lock-step with applied
+        # operations so repeat prompt formatting needs no network fetch
+        self._files = {}
+
+        # Formatted-prompt cache: rebuilding numbers every line of every
+        # file, so keep the result until a write invalidates it
+        self._formatted_cache = None
+
+        # Known blob SHAs per path, warmed by tree listings and fetches;
+        # lets writes skip the SHA-lookup GET and no-op writes skip the
+        # PUT entirely
+        self._shas = {}
+
+        # Operation dispatch table: one hash lookup per operation instead
+        # of walking an if/elif chain of string compares
+        self._dispatch = {
+            "CREATE_FILE": lambda op: self.create_file(
+                op["path"], op["content"], f"Create {op['path']}"),
+            "OVERWRITE_FILE": lambda op: self.overwrite_file(
+                op["path"], op["content"], f"Update {op['path']}"),
+            "INSERT_LINES": lambda op: self.insert_lines(
+                op["path"], op["line"], op["content"],
+                f"Insert lines in {op['path']} at line {op['line']}"),
+            "DELETE_FILE": lambda op: self.delete_file(
+                op["path"], f"Delete {op['path']}"),
+            "DELETE_LINES": lambda op: self.delete_lines(
+                op["path"], op["start_line"], op["end_line"],
+                f"Delete lines {op['start_line']}-{op['end_line']} from {op['path']}"),
+        }
+
+        # Pooled keep-alive session: get_full_codebase makes one call per
+        # file, so connection reuse saves a TLS handshake on each
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504]
+            )
+        ))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def get_file_content(self, path):
-        """Get the content of a file from the repository"""
+        """Get the content of a file from the repository.
+
+        With the SHA already cached (tree listings warm it), the raw
+        media type is requested: the body is the file itself, skipping
+        the JSON envelope and the ~1.37x base64 inflation plus decode.
+        Cold fetches fall back to the JSON form, which also yields the
+        SHA for the cache.
+        """
         url = f"{self.api_url}/repos/{self.repo}/contents/{path}"
         params = {"ref": self.branch}
-        
+        sha = self._shas.get(path)
+
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            if sha is not None:
+                response = self.session.get(
+                    url, params=params,
+                    headers={"Accept": "application/vnd.github.v3.raw"}
+                )
+                response.raise_for_status()
+                return {"content": response.text, "sha": sha}
+
+            response = self.session.get(url, params=params)
             response.raise_for_status()
-            
+
             data = response.json()
             content = base64.b64decode(data["content"]).decode("utf-8")
             sha = data["sha"]
-            
+            self._shas[path] = sha
+
             return {"content": content, "sha": sha}
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
+                self._shas.pop(path, None)
                 return None
             raise Exception(f"GitHub API error: {str(e)}")
+
+    def _get_file_sha(self, path):
+        """Blob SHA for a path - from the cache, or one metadata fetch"""
+        sha = self._shas.get(path)
+        if sha is not None:
+            return sha
+        file_data = self.get_file_content(path)
+        return file_data["sha"] if file_data else None
     
-    def get_full_codebase(self):
-        """Recursively get all files in the repository"""
-        def get_tree(path=""):
-            url = f"{self.api_url}/repos/{self.repo}/contents/{path}"
-            params = {"ref": self.branch}
-            
-            try:
-                response = requests.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                return response.json()
-            except:
+    def _list_all_paths(self):
+        """List every file path in the repository with one tree API call"""
+        url = f"{self.api_url}/repos/{self.repo}/git/trees/{self.branch}"
+        params = {"recursive": "1"}
+
+        try:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            tree = response.json().get("tree", [])
+            blobs = [item for item in tree if item["type"] == "blob"]
+            # Warm the SHA cache while we have the whole tree in hand
+            for item in blobs:
+                self._shas[item["path"]] = item["sha"]
+            return [item["path"] for item in blobs]
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
                 return []
-        
-        def traverse(path=""):
-            items = get_tree(path)
-            files = {}
-            
-            for item in items:
-                if item["type"] == "file":
-                    # Get file content
-                    file_data = self.get_file_content(item["path"])
-                    if file_data:
-                        files[item["path"]] = file_data["content"]
-                elif item["type"] == "dir":
-                    # Recursively get directory contents
-                    files.update(traverse(item["path"]))
-            
-            return files
-        
-        return traverse()
+            raise Exception(f"GitHub API error: {str(e)}")
+
+    def get_full_codebase(self):
+        """Get all files in the repository.
+
+        One tree call enumerates every path, then contents are fetched
+        concurrently - fetch time is bound by network latency, not CPU,
+        so parallel requests over the pooled session cut the wall time
+        roughly by the worker count. Workers are capped to stay under
+        GitHub's secondary rate limits (the session's Retry handles 429s).
+        """
+        paths = self._list_all_paths()
+        if not paths:
+            return {}
+
+        files = {}
+        with ThreadPoolExecutor(max_workers=min(16, len(paths))) as executor:
+            for path, file_data in zip(paths, executor.map(self.get_file_content, paths)):
+                if file_data:
+                    files[path] = file_data["content"]
+
+        return files
     
     def format_codebase_for_prompt(self):
-        """Format the entire codebase for DeepSeek prompt"""
-        files = self.get_full_codebase()
-        
+        """Format the entire codebase for DeepSeek prompt.
+
+        The formatted string is cached; writes through this manager
+        invalidate it, so steady-state chat turns return it without
+        walking or re-numbering anything.
+        """
+        if self._formatted_cache is not None:
+            return self._formatted_cache
+
+        # Fetch the tree once; apply_operation keeps the mirror current
+        if not self._files:
+            self._files = self.get_full_codebase()
+        files = self._files
+
         if not files:
             return "Repository is empty."
-        
-        formatted = []
+
+        # Write straight into one C-backed buffer; splitlines(True) keeps
+        # line endings so nothing is split out only to be re-joined
+        buf = io.StringIO()
         for path, content in files.items():
-            lines = content.split("\n")
-            numbered_lines = [f"{i+1:4d} | {line}" for i, line in enumerate(lines)]
-            
-            formatted.append(f"=== FILE: {path} ===")
-            formatted.append("\n".join(numbered_lines))
-            formatted.append("")
-        
-        return "\n".join(formatted)
+            buf.write(f"=== FILE: {path} ===\n")
+            i = 1
+            for line in content.splitlines(True):
+                buf.write(f"{i:4d} | ")
+                buf.write(line)
+                i += 1
+            buf.write("\n\n")
+
+        self._formatted_cache = buf.getvalue()
+        return self._formatted_cache
     
     def create_file(self, path, content, message="Create file"):
         """Create a new file in the repository"""
         url = f"{self.api_url}/repos/{self.repo}/contents/{path}"
         
-        encoded_content = base64.b64encode(content.encode("utf-8")).decode("utf-8")
+        encoded_content = base64.b64encode(content.encode("utf-8")).decode("ascii")
         
         data = {
             "message": message,
@@ -94,34 +252,57 @@ class GitHubManager:
         }
         
         try:
-            response = requests.put(url, headers=self.headers, json=data)
+            response = self.session.put(url, json=data)
             response.raise_for_status()
+            self._files[path] = content
+            self._shas[path] = response.json()["content"]["sha"]
+            self._formatted_cache = None
             return True
         except requests.exceptions.HTTPError as e:
             raise Exception(f"Failed to create file {path}: {str(e)}")
     
-    def overwrite_file(self, path, content, message="Update file"):
-        """Overwrite the entire content of a file"""
-        # Get current file SHA
-        file_data = self.get_file_content(path)
-        
-        if not file_data:
-            # File doesn't exist, create it
-            return self.create_file(path, content, message)
-        
+    def overwrite_file(self, path, content, message="Update file", sha=None):
+        """Overwrite the entire content of a file.
+
+        Callers that already fetched the file can pass its `sha` to skip
+        the extra round trip to look it up again.
+        """
+        raw = content.encode("utf-8")
+
+        if sha is None:
+            sha = self._shas.get(path)
+
+        if sha is None:
+            file_data = self.get_file_content(path)
+
+            if not file_data:
+                # File doesn't exist, create it
+                return self.create_file(path, content, message)
+
+            sha = file_data["sha"]
+
+        # Byte-identical content hashes to the same blob SHA the remote
+        # already has - skip the PUT and the spurious commit it would make
+        if _git_blob_sha(raw) == sha:
+            self._files[path] = content
+            return True
+
         url = f"{self.api_url}/repos/{self.repo}/contents/{path}"
-        encoded_content = base64.b64encode(content.encode("utf-8")).decode("utf-8")
-        
+        encoded_content = base64.b64encode(raw).decode("ascii")
+
         data = {
             "message": message,
             "content": encoded_content,
-            "sha": file_data["sha"],
+            "sha": sha,
             "branch": self.branch
         }
         
         try:
-            response = requests.put(url, headers=self.headers, json=data)
+            response = self.session.put(url, json=data)
             response.raise_for_status()
+            self._files[path] = content
+            self._shas[path] = response.json()["content"]["sha"]
+            self._formatted_cache = None
             return True
         except requests.exceptions.HTTPError as e:
             raise Exception(f"Failed to overwrite file {path}: {str(e)}")
@@ -133,18 +314,10 @@ class GitHubManager:
         if not file_data:
             raise Exception(f"File {path} does not exist")
         
-        lines = file_data["content"].split("\n")
-        
-        # Validate line number
-        if line_number < 1 or line_number > len(lines) + 1:
-            raise Exception(f"Invalid line number {line_number}. File has {len(lines)} lines.")
-        
-        # Insert content at the specified line (before that line)
-        insert_lines = content.split("\n")
-        new_lines = lines[:line_number-1] + insert_lines + lines[line_number-1:]
-        new_content = "\n".join(new_lines)
-        
-        return self.overwrite_file(path, new_content, message)
+        new_content = _insert_into(file_data["content"], line_number, content)
+
+        # Pass the SHA we already have so overwrite_file skips a re-fetch
+        return self.overwrite_file(path, new_content, message, sha=file_data["sha"])
     
     def delete_file(self, path, message="Delete file"):
         """Delete a file from the repository"""
@@ -162,8 +335,11 @@ class GitHubManager:
         }
         
         try:
-            response = requests.delete(url, headers=self.headers, json=data)
+            response = self.session.delete(url, json=data)
             response.raise_for_status()
+            self._files.pop(path, None)
+            self._shas.pop(path, None)
+            self._formatted_cache = None
             return True
         except requests.exceptions.HTTPError as e:
             raise Exception(f"Failed to delete file {path}: {str(e)}")
@@ -175,67 +351,148 @@ class GitHubManager:
         if not file_data:
             raise Exception(f"File {path} does not exist")
         
-        lines = file_data["content"].split("\n")
-        
-        # Validate line numbers
-        if start_line < 1 or end_line > len(lines) or start_line > end_line:
-            raise Exception(
-                f"Invalid line range {start_line}-{end_line}. File has {len(lines)} lines."
-            )
-        
-        # Delete lines (convert to 0-indexed)
-        new_lines = lines[:start_line-1] + lines[end_line:]
-        new_content = "\n".join(new_lines)
-        
-        return self.overwrite_file(path, new_content, message)
+        new_content = _delete_from(file_data["content"], start_line, end_line)
+
+        # Pass the SHA we already have so overwrite_file skips a re-fetch
+        return self.overwrite_file(path, new_content, message, sha=file_data["sha"])
     
+    def _base_commit(self):
+        """Get the branch head commit SHA and its tree SHA"""
+        url = f"{self.api_url}/repos/{self.repo}/git/refs/heads/{self.branch}"
+        response = self.session.get(url)
+        response.raise_for_status()
+        head_sha = response.json()["object"]["sha"]
+
+        url = f"{self.api_url}/repos/{self.repo}/git/commits/{head_sha}"
+        response = self.session.get(url)
+        response.raise_for_status()
+        return head_sha, response.json()["tree"]["sha"]
+
+    def _create_blob(self, content):
+        """Upload a blob and return its SHA"""
+        url = f"{self.api_url}/repos/{self.repo}/git/blobs"
+        response = self.session.post(url, json={"content": content, "encoding": "utf-8"})
+        response.raise_for_status()
+        return response.json()["sha"]
+
+    def apply_batch(self, operations, message="Apply operations"):
+        """Apply several operations as one atomic commit.
+
+        Uses the Git Data API instead of per-file contents PUTs: blobs
+        are uploaded in parallel, then one tree, one commit, and one ref
+        update land everything together. K operations cost ~K parallel
+        blob uploads plus three serial calls rather than 2K serial calls
+        and K separate commits.
+        """
+        # Collapse the operations into final per-path contents (None
+        # marks a deletion); later operations see earlier ones' edits
+        changes = {}
+
+        def current_content(path):
+            if path in changes:
+                if changes[path] is None:
+                    raise Exception(f"File {path} does not exist")
+                return changes[path]
+            if path in self._files:
+                return self._files[path]
+            file_data = self.get_file_content(path)
+            if not file_data:
+                raise Exception(f"File {path} does not exist")
+            return file_data["content"]
+
+        for operation in operations:
+            op_type = operation.get("operation")
+            if op_type in ("VERIFY_COMPLETE", "NEEDS_RETRY"):
+                # Conversational entries the model may append to a batch;
+                # there is nothing to commit for them
+                continue
+            if op_type in ("CREATE_FILE", "OVERWRITE_FILE"):
+                changes[operation["path"]] = operation["content"]
+            elif op_type == "INSERT_LINES":
+                changes[operation["path"]] = _insert_into(
+                    current_content(operation["path"]),
+                    operation["line"],
+                    operation["content"]
+                )
+            elif op_type == "DELETE_LINES":
+                changes[operation["path"]] = _delete_from(
+                    current_content(operation["path"]),
+                    operation["start_line"],
+                    operation["end_line"]
+                )
+            elif op_type == "DELETE_FILE":
+                changes[operation["path"]] = None
+            else:
+                raise Exception(f"Unknown operation type: {op_type}")
+
+        if not changes:
+            return []
+
+        head_sha, base_tree_sha = self._base_commit()
+
+        # Upload blobs concurrently; deletions need no blob
+        to_upload = [(path, content) for path, content in changes.items()
+                     if content is not None]
+        blob_shas = {}
+        if to_upload:
+            with ThreadPoolExecutor(max_workers=min(16, len(to_upload))) as executor:
+                for (path, _), sha in zip(
+                    to_upload,
+                    executor.map(lambda item: self._create_blob(item[1]), to_upload)
+                ):
+                    blob_shas[path] = sha
+
+        tree_entries = []
+        for path, content in changes.items():
+            tree_entries.append({
+                "path": path,
+                "mode": "100644",
+                "type": "blob",
+                "sha": blob_shas[path] if content is not None else None
+            })
+
+        url = f"{self.api_url}/repos/{self.repo}/git/trees"
+        response = self.session.post(url, json={
+            "base_tree": base_tree_sha,
+            "tree": tree_entries
+        })
+        response.raise_for_status()
+        tree_sha = response.json()["sha"]
+
+        url = f"{self.api_url}/repos/{self.repo}/git/commits"
+        response = self.session.post(url, json={
+            "message": message,
+            "tree": tree_sha,
+            "parents": [head_sha]
+        })
+        response.raise_for_status()
+        commit_sha = response.json()["sha"]
+
+        url = f"{self.api_url}/repos/{self.repo}/git/refs/heads/{self.branch}"
+        response = self.session.patch(url, json={"sha": commit_sha})
+        response.raise_for_status()
+
+        # Keep the mirror in lock-step with what just landed
+        self._formatted_cache = None
+        for path, content in changes.items():
+            if content is None:
+                self._files.pop(path, None)
+                self._shas.pop(path, None)
+            else:
+                self._files[path] = content
+                self._shas[path] = blob_shas[path]
+
+        return [True] * len(operations)
+
     def apply_operation(self, operation):
         """Apply a single operation to the repository"""
         op_type = operation.get("operation")
-    
+
         if op_type == "MULTIPLE_OPERATIONS":
-            # Handle nested operations
-            nested_ops = operation.get("operations", [])
-            results = []
-            for nested_op in nested_ops:
-                results.append(self.apply_operation(nested_op))
-                return results
-    
-        elif op_type == "CREATE_FILE":
-            return self.create_file(
-                operation["path"],
-                operation["content"],
-                f"Create {operation['path']}"
-            )
-    
-        elif op_type == "OVERWRITE_FILE":
-            return self.overwrite_file(
-                operation["path"],
-                operation["content"],
-                f"Update {operation['path']}"
-            )
-    
-        elif op_type == "INSERT_LINES":
-            return self.insert_lines(
-                operation["path"],
-                operation["line"],
-                operation["content"],
-                f"Insert lines in {operation['path']} at line {operation['line']}"
-            )
-    
-        elif op_type == "DELETE_FILE":
-            return self.delete_file(
-                operation["path"],
-                f"Delete {operation['path']}"
-            )
-    
-        elif op_type == "DELETE_LINES":
-            return self.delete_lines(
-                operation["path"],
-                operation["start_line"],
-                operation["end_line"],
-                f"Delete lines {operation['start_line']}-{operation['end_line']} from {operation['path']}"
-            )
-    
-        else:
+            # Land all nested operations as one atomic commit
+            return self.apply_batch(operation.get("operations", []))
+
+        handler = self._dispatch.get(op_type)
+        if handler is None:
             raise Exception(f"Unknown operation type: {op_type}")
+        return handler(operation)
@@ -1,8 +1,218 @@
 import requests
 import time
-import json
+import orjson
+import re
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import RAILWAY_API_KEY, RAILWAY_API_URL, RAILWAY_PROJECT_ID, DEPLOYMENT_POLL_INTERVAL, DEPLOYMENT_TIMEOUT
 
+logger = logging.getLogger(__name__)
+
+# Query variations are static text; build the tuples once at import so
+# each call just references them
+_DEPLOYMENT_QUERIES = (
+    # Query variation 1: Standard structure
+    """
+    query GetDeployments($projectId: String!) {
+        project(id: $projectId) {
+            deployments(first: 1, orderBy: {field: CREATED_AT, direction: DESC}) {
+                edges {
+                    node {
+                        id
+                        status
+                        createdAt
+                    }
+                }
+            }
+        }
+    }
+    """,
+    # Query variation 2: Simplified structure
+    """
+    query GetDeployments($projectId: String!) {
+        deployments(first: 1, input: {projectId: $projectId}) {
+            edges {
+                node {
+                    id
+                    status
+                    createdAt
+                }
+            }
+        }
+    }
+    """,
+    # Query variation 3: Direct project query
+    """
+    query GetProject($projectId: String!) {
+        project(id: $projectId) {
+            id
+            name
+            deployments(first: 5) {
+                edges {
+                    node {
+                        id
+                        status
+                        createdAt
+                    }
+                }
+            }
+        }
+    }
+    """,
+)
+
+_LOG_QUERIES = (
+    # Query 1: Standard deploymentLogs; only the tail ever makes
+    # it into the prompt, so don't download more than that
+    """
+    query GetDeploymentLogs($deploymentId: String!, $limit: Int!) {
+        deploymentLogs(deploymentId: $deploymentId, limit: $limit) {
+            message
+            timestamp
+        }
+    }
+    """,
+    # Query 2: Logs within deployment
+    """
+    query GetDeployment($deploymentId: String!) {
+        deployment(id: $deploymentId) {
+            logs {
+                message
+                timestamp
+            }
+        }
+    }
+    """,
+    # Query 3: Build logs
+    """
+    query GetDeployment($deploymentId: String!) {
+        deployment(id: $deploymentId) {
+            buildLogs
+            deployLogs
+        }
+    }
+    """,
+)
+
+_TRIGGER_DEPLOYMENT_MUTATION = """
+mutation DeploymentTrigger($projectId: String!) {
+    deploymentTrigger(input: {projectId: $projectId}) {
+        id
+    }
+}
+"""
+
+# Polling only ever decides "is status terminal?", so it uses the same
+# shapes with the selection trimmed to id/status - fewer resolvers run
+# server-side and the payload roughly halves
+_DEPLOYMENT_STATUS_QUERIES = tuple(
+    re.sub(r"\n\s*createdAt", "", q) for q in _DEPLOYMENT_QUERIES
+)
+
+# Railway statuses: INITIALIZING, BUILDING, DEPLOYING, SUCCESS, FAILED,
+# CRASHED, REMOVED - the last four end the wait loop
+_TERMINAL_STATUSES = frozenset({"SUCCESS", "FAILED", "CRASHED", "REMOVED"})
+
+# One aliased document covering every deployment-query variation: the
+# first probe (and any schema-drift re-probe) costs a single round trip
+# instead of up to three serial ones
+_DEPLOYMENTS_PROBE_QUERY = """
+query ProbeDeployments($projectId: String!) {
+    v1: project(id: $projectId) {
+        deployments(first: 1, orderBy: {field: CREATED_AT, direction: DESC}) {
+            edges {
+                node {
+                    id
+                    status
+                    createdAt
+                }
+            }
+        }
+    }
+    v2: deployments(first: 1, input: {projectId: $projectId}) {
+        edges {
+            node {
+                id
+                status
+                createdAt
+            }
+        }
+    }
+    v3: project(id: $projectId) {
+        deployments(first: 5) {
+            edges {
+                node {
+                    id
+                    status
+                    createdAt
+                }
+            }
+        }
+    }
+}
+"""
+
+# Standalone auth probe, used when the batched diagnostics document is
+# rejected outright by schema validation
+_ME_QUERY = """
+query {
+    me {
+        id
+        email
+    }
+}
+"""
+
+# Connection diagnostics batch the auth check and the deployment read
+# into one document so the health check costs a single round trip
+_DIAG_QUERY = """
+query Diag($projectId: String!) {
+    me {
+        id
+        email
+    }
+    project(id: $projectId) {
+        deployments(first: 1, orderBy: {field: CREATED_AT, direction: DESC}) {
+            edges {
+                node {
+                    id
+                    status
+                    createdAt
+                }
+            }
+        }
+    }
+}
+"""
+
+
+@dataclass(slots=True)
+class Deployment:
+    """Typed view of a deployment node. Slotted attribute access is what
+    the wait loop reads every poll, replacing repeated dict lookups, and
+    construction fails loudly if the schema drops a required field."""
+
+    id: str
+    status: str
+    created_at: str = ""
+
+    @classmethod
+    def from_node(cls, node):
+        return cls(
+            id=node["id"],
+            status=node["status"],
+            created_at=node.get("createdAt") or "",
+        )
+
+
 class RailwayManager:
     def __init__(self):
         self.api_key = RAILWAY_API_KEY
@@ -10,9 +220,63 @@ class RailwayManager:
         self.project_id = RAILWAY_PROJECT_ID
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            # Log payloads are verbose text that compresses very well;
+            # requests decompresses transparently
+            "Accept-Encoding": "gzip, deflate"
         }
-    
+
+        # Pooled keep-alive session: the deployment wait loop polls the
+        # same endpoint repeatedly, so reuse one TLS connection
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[502, 503, 504]
+            )
+        ))
+
+        # Short-TTL memo of the latest deployment so adjacent callers
+        # (e.g. test_connection followed by a direct status check) don't
+        # pay two identical round trips within the same second
+        self._deployment_cache = {}
+        self._deployment_cache_ttl = 1.0
+
+        # Remember which query variation the Railway schema actually
+        # accepts so steady-state calls stop burning round trips on the
+        # variants that are known to fail
+        self._deployment_query_idx = None
+        self._logs_query_idx = None
+
+        # Webhook-driven waits: the app's /webhook/railway route calls
+        # notify_deployment, which wakes wait_for_deployment immediately
+        # instead of letting it sleep out its full poll interval
+        self._webhook_event = threading.Event()
+        self._webhook_payload = None
+
+        # Last 200 observed status transitions (timestamp, deployment id,
+        # status) for post-mortem inspection - the poll loop logs lazily
+        # instead of streaming every poll to stdout
+        self._status_history = deque(maxlen=200)
+
+    def notify_deployment(self, payload=None):
+        """Signal that Railway pushed a deployment event (webhook route)"""
+        self._webhook_payload = payload or {}
+        self._webhook_event.set()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def graphql_query(self, query, variables=None):
         """Execute a GraphQL query against Railway API"""
         payload = {
@@ -21,23 +285,23 @@ class RailwayManager:
         }
         
         try:
-            print(f"Sending Railway API request...")
-            print(f"Endpoint: {self.api_url}")
-            print(f"Variables: {json.dumps(variables, indent=2)}")
+            # Lazy %s formatting: with DEBUG off these cost a level check,
+            # not a JSON re-serialization per poll
+            logger.debug("Sending Railway API request to %s", self.api_url)
+            logger.debug("Variables: %s", variables)
             
-            response = requests.post(
+            # orjson encodes/decodes a few times faster than the stdlib
+            # codec requests would use; Content-Type is on the session
+            response = self.session.post(
                 self.api_url,
-                headers=self.headers,
-                json=payload,
+                data=orjson.dumps(payload),
                 timeout=30
             )
             
-            print(f"Railway API Status Code: {response.status_code}")
+            logger.debug("Railway API status code: %s", response.status_code)
             
             response.raise_for_status()
-            result = response.json()
-            
-            return result
+            return orjson.loads(response.content)
             
         except requests.exceptions.RequestException as e:
             error_detail = ""
@@ -48,272 +312,367 @@ class RailwayManager:
                     pass
             raise Exception(f"Railway API error: {str(e)}{error_detail}")
     
-    def get_latest_deployment(self):
-        """Get the latest deployment for the project"""
-        # Try multiple query variations for Railway API compatibility
-        queries = [
-            # Query variation 1: Standard structure
-            """
-            query GetDeployments($projectId: String!) {
-                project(id: $projectId) {
-                    deployments(first: 1, orderBy: {field: CREATED_AT, direction: DESC}) {
-                        edges {
-                            node {
-                                id
-                                status
-                                createdAt
-                            }
-                        }
-                    }
-                }
-            }
-            """,
-            # Query variation 2: Simplified structure
-            """
-            query GetDeployments($projectId: String!) {
-                deployments(first: 1, input: {projectId: $projectId}) {
-                    edges {
-                        node {
-                            id
-                            status
-                            createdAt
-                        }
-                    }
-                }
-            }
-            """,
-            # Query variation 3: Direct project query
-            """
-            query GetProject($projectId: String!) {
-                project(id: $projectId) {
-                    id
-                    name
-                    deployments(first: 5) {
-                        edges {
-                            node {
-                                id
-                                status
-                                createdAt
-                            }
-                        }
-                    }
-                }
-            }
-            """
-        ]
+    @staticmethod
+    def _extract_deployment_node(result):
+        """Pull the newest deployment node out of either response shape
+        (data.project.deployments.edges or data.deployments.edges) as a
+        Deployment, or None when the response holds no deployments."""
+        data = result.get("data") or {}
+        edges = (
+            ((data.get("project") or {}).get("deployments") or {}).get("edges")
+            or (data.get("deployments") or {}).get("edges")
+        )
+        return Deployment.from_node(edges[0]["node"]) if edges else None
+
+    def _probe_latest_deployment(self, variables):
+        """Try every deployment-query shape in one aliased request"""
+        try:
+            result = self.graphql_query(_DEPLOYMENTS_PROBE_QUERY, variables)
+        except Exception as e:
+            logger.debug("batched deployment probe failed: %s", e)
+            return None
+
+        data = result.get("data") or {}
+        # v1/v3 nest edges under project.deployments; v2 is a root field
+        extractors = (
+            ("v1", lambda d: (d.get("deployments") or {}).get("edges")),
+            ("v2", lambda d: d.get("edges")),
+            ("v3", lambda d: (d.get("deployments") or {}).get("edges")),
+        )
+        for idx, (alias, extract) in enumerate(extractors):
+            alias_data = data.get(alias)
+            if not alias_data:
+                continue
+            edges = extract(alias_data)
+            if edges:
+                self._deployment_query_idx = idx
+                return Deployment.from_node(edges[0]["node"])
+        return None
+
+    def get_latest_deployment(self, status_only=False, force=False):
+        """Get the latest deployment for the project.
+
+        status_only trims the selection to id/status for poll loops that
+        never read anything else. Results are memoized for about a
+        second; force bypasses the memo for callers that need a fresh
+        answer right now.
+        """
+        if not force:
+            cached = self._deployment_cache.get(status_only)
+            if cached and time.monotonic() - cached[0] < self._deployment_cache_ttl:
+                return cached[1]
+
+        queries = _DEPLOYMENT_STATUS_QUERIES if status_only else _DEPLOYMENT_QUERIES
         
         variables = {"projectId": self.project_id}
         last_error = None
-        
-        for i, query in enumerate(queries):
+
+        # No known-good variant yet: try all shapes in one batched request
+        if self._deployment_query_idx is None:
+            deployment = self._probe_latest_deployment(variables)
+            if deployment:
+                logger.debug("found deployment %s with status %s",
+                             deployment.id, deployment.status)
+                self._deployment_cache[status_only] = (time.monotonic(), deployment)
+                return deployment
+
+        # Lead with the cached winner; fall back to probing the rest on
+        # schema drift
+        order = list(range(len(queries)))
+        if self._deployment_query_idx is not None:
+            order.remove(self._deployment_query_idx)
+            order.insert(0, self._deployment_query_idx)
+
+        for i in order:
+            query = queries[i]
             try:
-                print(f"Trying Railway API query variation {i+1}...")
+                logger.debug("trying Railway API query variation %d", i + 1)
                 result = self.graphql_query(query, variables)
                 
-                # Log the raw response for debugging
-                print(f"Railway API Response: {json.dumps(result, indent=2)}")
+                # Raw response only when someone is actually debugging -
+                # for log-heavy payloads the pretty dump alone can dwarf
+                # the cost of the request itself
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Railway API response: %s",
+                                 orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
                 
                 if "errors" in result:
-                    error_msg = json.dumps(result['errors'], indent=2)
-                    print(f"GraphQL errors in query {i+1}: {error_msg}")
-                    last_error = f"GraphQL errors: {error_msg}"
+                    logger.debug("GraphQL errors in query %d: %s", i + 1, result["errors"])
+                    last_error = f"GraphQL errors: {result['errors']}"
                     continue
                 
-                # Try to extract deployments from various response structures
-                deployments = None
-                
-                # Structure 1: data.project.deployments.edges
-                if "data" in result and result["data"]:
-                    if "project" in result["data"] and result["data"]["project"]:
-                        project_data = result["data"]["project"]
-                        if "deployments" in project_data:
-                            deployments = project_data["deployments"].get("edges", [])
-                    # Structure 2: data.deployments.edges
-                    elif "deployments" in result["data"]:
-                        deployments = result["data"]["deployments"].get("edges", [])
-                
-                if deployments and len(deployments) > 0:
-                    deployment = deployments[0]["node"]
-                    print(f"Found deployment: {deployment['id']} with status {deployment['status']}")
+                deployment = self._extract_deployment_node(result)
+                if deployment:
+                    logger.debug("found deployment %s with status %s",
+                                 deployment.id, deployment.status)
+                    self._deployment_query_idx = i
+                    self._deployment_cache[status_only] = (time.monotonic(), deployment)
                     return deployment
                 else:
-                    print(f"No deployments found in query {i+1}")
+                    logger.debug("no deployments found in query %d", i + 1)
                     last_error = "No deployments found in response"
                     continue
                     
             except Exception as e:
-                print(f"Error with query variation {i+1}: {str(e)}")
+                logger.debug("error with query variation %d: %s", i + 1, e)
                 last_error = str(e)
                 continue
         
-        # If all queries failed, raise the last error
+        # If all queries failed, forget the cached variant and raise
+        self._deployment_query_idx = None
         if last_error:
             raise Exception(f"Failed to get deployment after trying all query variations: {last_error}")
         
         return None
     
-    def get_deployment_logs(self, deployment_id):
-        """Get logs for a specific deployment"""
-        # Try multiple query structures for logs
-        queries = [
-            # Query 1: Standard deploymentLogs
-            """
-            query GetDeploymentLogs($deploymentId: String!) {
-                deploymentLogs(deploymentId: $deploymentId, limit: 1000) {
-                    message
-                    timestamp
-                }
-            }
-            """,
-            # Query 2: Logs within deployment
-            """
-            query GetDeployment($deploymentId: String!) {
-                deployment(id: $deploymentId) {
-                    logs {
-                        message
-                        timestamp
-                    }
-                }
-            }
-            """,
-            # Query 3: Build logs
-            """
-            query GetDeployment($deploymentId: String!) {
-                deployment(id: $deploymentId) {
-                    buildLogs
-                    deployLogs
-                }
+    @staticmethod
+    def _extract_logs(result, limit):
+        """Pull log entries out of whichever response shape a log-query
+        variation returned, or None if the response holds no logs."""
+        if "errors" in result:
+            return None
+
+        data = result.get("data") or {}
+
+        # Structure 1: deploymentLogs array
+        logs = data.get("deploymentLogs")
+        if logs:
+            return logs
+
+        # Structure 2: deployment.logs
+        deployment = data.get("deployment") or {}
+        logs = deployment.get("logs")
+        if logs:
+            return logs
+
+        # Structure 3: plain-text build/deploy log blobs. Convert to the
+        # structured format, keeping only the tail - the deque bounds
+        # memory no matter how large the blobs are, but callers get a
+        # plain list like the other structures (deques don't slice)
+        if "buildLogs" in deployment:
+            lines = (
+                line
+                for blob in (deployment.get("buildLogs", ""),
+                             deployment.get("deployLogs", ""))
+                for line in blob.splitlines()
+                if line.strip()
+            )
+            logs = deque(
+                ({"message": line, "timestamp": ""} for line in lines),
+                maxlen=limit
+            )
+            if logs:
+                return list(logs)
+
+        return None
+
+    def _probe_deployment_logs(self, variables, limit):
+        """First log fetch (or re-probe after schema drift): fire all
+        query variations concurrently over the pooled session and keep
+        the first one that yields logs, instead of paying up to 3x HTTP
+        latency walking them serially."""
+        with ThreadPoolExecutor(max_workers=len(_LOG_QUERIES)) as executor:
+            futures = {
+                executor.submit(self.graphql_query, query, variables): i
+                for i, query in enumerate(_LOG_QUERIES)
             }
-            """
-        ]
-        
-        variables = {"deploymentId": deployment_id}
-        
-        for i, query in enumerate(queries):
-            try:
-                print(f"Fetching logs with query variation {i+1}...")
-                result = self.graphql_query(query, variables)
-                
-                if "errors" in result:
-                    print(f"Log query {i+1} errors: {result['errors']}")
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    logs = self._extract_logs(future.result(), limit)
+                except Exception as e:
+                    logger.debug("error fetching logs with query %d: %s", i + 1, e)
                     continue
-                
-                # Try to extract logs from different structures
-                logs = []
-                
-                if "data" in result:
-                    # Structure 1: deploymentLogs array
-                    if "deploymentLogs" in result["data"]:
-                        logs = result["data"]["deploymentLogs"]
-                    # Structure 2: deployment.logs
-                    elif "deployment" in result["data"] and result["data"]["deployment"]:
-                        deployment = result["data"]["deployment"]
-                        if "logs" in deployment:
-                            logs = deployment["logs"]
-                        elif "buildLogs" in deployment:
-                            # Convert string logs to structured format
-                            build_logs = deployment.get("buildLogs", "")
-                            deploy_logs = deployment.get("deployLogs", "")
-                            combined = f"{build_logs}\n{deploy_logs}"
-                            logs = [{"message": line, "timestamp": ""} for line in combined.split("\n") if line.strip()]
-                
                 if logs:
-                    print(f"Successfully retrieved {len(logs)} log entries")
+                    self._logs_query_idx = i
+                    return logs
+        return None
+
+    def get_deployment_logs(self, deployment_id, limit=100):
+        """Get the last `limit` logs for a specific deployment"""
+        variables = {"deploymentId": deployment_id, "limit": limit}
+
+        # Until a variation is known to work, race them all and let the
+        # first usable response win; afterwards the winner alone is asked
+        if self._logs_query_idx is None:
+            logger.debug("fetching logs (probing query variations concurrently)")
+            logs = self._probe_deployment_logs(variables, limit)
+            if logs:
+                logger.info("retrieved %d log entries", len(logs))
+                return logs
+        else:
+            i = self._logs_query_idx
+            try:
+                logger.debug("fetching logs with query variation %d", i + 1)
+                logs = self._extract_logs(self.graphql_query(_LOG_QUERIES[i], variables), limit)
+                if logs:
+                    logger.info("retrieved %d log entries", len(logs))
                     return logs
-                    
             except Exception as e:
-                print(f"Error fetching logs with query {i+1}: {str(e)}")
-                continue
-        
-        print("Could not retrieve logs from any query variation")
+                logger.debug("error fetching logs with query %d: %s", i + 1, e)
+            # The cached winner stopped working - fall back to a re-probe
+            self._logs_query_idx = None
+            logs = self._probe_deployment_logs(variables, limit)
+            if logs:
+                logger.info("retrieved %d log entries", len(logs))
+                return logs
+
+        self._logs_query_idx = None
+        logger.warning("could not retrieve logs from any query variation")
         return []
     
-    def wait_for_deployment(self, initial_deployment_id=None):
+    async def wait_for_deployment_async(self, initial_deployment_id=None, use_webhook=True):
         """
         Wait for a deployment to complete and return its status and logs.
         Returns: (status, logs, deployment_id)
+
+        Runs on the event loop: the blocking GraphQL calls are pushed to
+        worker threads only for their own duration, so the minutes-long
+        wait itself pins no thread and many deployments can be awaited
+        concurrently. With use_webhook (default), an inbound Railway
+        webhook wakes the loop at once and triggers an immediate re-poll,
+        so status changes are seen with ~0 lag while the polling loop
+        remains the fallback when no webhook arrives.
         """
         start_time = time.time()
         last_deployment_id = initial_deployment_id
         last_status = None
         poll_count = 0
-        
-        print(f"Waiting for Railway deployment...")
-        print(f"Timeout: {DEPLOYMENT_TIMEOUT} seconds")
-        print(f"Poll interval: {DEPLOYMENT_POLL_INTERVAL} seconds")
-        
+        attempt = 0
+
+        def backoff_delay(status=None):
+            # Phase-aware pacing: DEPLOYING is near-terminal, so hold the
+            # tight base interval for low-latency detection; the long
+            # INITIALIZING/BUILDING stretch backs off toward the cap while
+            # nothing changes. Jitter keeps concurrent waiters unsynced.
+            if status == "DEPLOYING":
+                return DEPLOYMENT_POLL_INTERVAL + random.uniform(0, 1)
+            return min(30, DEPLOYMENT_POLL_INTERVAL * (1.5 ** attempt)) + random.uniform(0, 1)
+
+        async def wait_interval(delay):
+            # Returns True if a webhook cut the wait short; the webhook
+            # flag is checked at sub-second granularity without leaving
+            # the event loop
+            deadline = time.monotonic() + delay
+            while True:
+                if use_webhook and self._webhook_event.is_set():
+                    self._webhook_event.clear()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                await asyncio.sleep(min(0.25, remaining))
+
+        if use_webhook:
+            self._webhook_event.clear()
+
+        # Fast path: when the project has already settled on a deployment
+        # other than the one we started from (common when re-running
+        # against a deployed project), return at once instead of paying a
+        # poll interval to discover it inside the loop
+        try:
+            deployment = await asyncio.to_thread(self.get_latest_deployment,
+                                                 status_only=True)
+            if (deployment and deployment.status in _TERMINAL_STATUSES
+                    and deployment.id != initial_deployment_id):
+                logger.info("deployment %s already terminal (%s), skipping poll loop",
+                            deployment.id, deployment.status)
+                logs = await asyncio.to_thread(self.get_deployment_logs, deployment.id)
+                log_messages = [log.get("message", str(log)) for log in logs]
+                return deployment.status, log_messages, deployment.id
+        except Exception:
+            logger.exception("initial deployment check failed")
+
+        logger.info("Waiting for Railway deployment (timeout=%ds poll_interval=%ds)",
+                    DEPLOYMENT_TIMEOUT, DEPLOYMENT_POLL_INTERVAL)
+
         while time.time() - start_time < DEPLOYMENT_TIMEOUT:
             poll_count += 1
-            print(f"\n--- Poll #{poll_count} (elapsed: {int(time.time() - start_time)}s) ---")
-            
+
             try:
-                deployment = self.get_latest_deployment()
-                
+                deployment = await asyncio.to_thread(
+                    self.get_latest_deployment, status_only=True, force=True
+                )
+
                 if not deployment:
-                    print("No deployment found, waiting...")
-                    time.sleep(DEPLOYMENT_POLL_INTERVAL)
+                    logger.info("poll=%d elapsed=%ds no deployment found, waiting",
+                                poll_count, int(time.time() - start_time))
+                    if await wait_interval(backoff_delay()):
+                        attempt = 0
+                    else:
+                        attempt += 1
                     continue
-                
-                deployment_id = deployment["id"]
-                status = deployment["status"]
-                
-                print(f"Deployment ID: {deployment_id}")
-                print(f"Status: {status}")
-                
-                # Track status changes
+
+                deployment_id = deployment.id
+                status = deployment.status
+
+                logger.debug("poll=%d elapsed=%ds deployment=%s status=%s",
+                             poll_count, int(time.time() - start_time),
+                             deployment_id, status)
+
+                # Track status changes; a transition resets the backoff so
+                # the next phase is observed promptly. Transitions go to a
+                # bounded ring buffer for post-mortem rather than stdout.
                 if status != last_status:
-                    print(f"Status changed: {last_status} -> {status}")
+                    logger.info("status changed: %s -> %s (deployment=%s poll=%d)",
+                                last_status, status, deployment_id, poll_count)
+                    self._status_history.append((time.time(), deployment_id, status))
                     last_status = status
-                
+                    attempt = 0
+
                 # If we have a new deployment, update tracking
                 if deployment_id != last_deployment_id:
-                    print(f"New deployment detected!")
-                    print(f"Previous: {last_deployment_id}")
-                    print(f"Current: {deployment_id}")
+                    logger.info("new deployment detected: %s -> %s",
+                                last_deployment_id, deployment_id)
                     last_deployment_id = deployment_id
                     last_status = status
-                
+
                 # Check if deployment is complete
-                # Railway statuses: INITIALIZING, BUILDING, DEPLOYING, SUCCESS, FAILED, CRASHED, REMOVED
-                terminal_statuses = ["SUCCESS", "FAILED", "CRASHED", "REMOVED"]
-                
-                if status in terminal_statuses:
-                    print(f"Deployment reached terminal status: {status}")
-                    logs = self.get_deployment_logs(deployment_id)
+                if status in _TERMINAL_STATUSES:
+                    logger.info("deployment %s reached terminal status %s",
+                                deployment_id, status)
+                    logs = await asyncio.to_thread(self.get_deployment_logs, deployment_id)
                     log_messages = [log.get("message", str(log)) for log in logs]
                     return status, log_messages, deployment_id
-                
+
                 # Still deploying
-                print(f"Deployment in progress ({status}), waiting {DEPLOYMENT_POLL_INTERVAL}s...")
-                time.sleep(DEPLOYMENT_POLL_INTERVAL)
-                
-            except Exception as e:
-                print(f"Error checking deployment: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                time.sleep(DEPLOYMENT_POLL_INTERVAL)
-        
+                delay = backoff_delay(status)
+                logger.debug("deployment in progress (%s), waiting up to %.1fs",
+                             status, delay)
+                if await wait_interval(delay):
+                    logger.info("webhook received - re-polling immediately")
+                    attempt = 0
+                else:
+                    attempt += 1
+
+            except Exception:
+                logger.exception("deployment poll error (poll=%d)", poll_count)
+                if await wait_interval(backoff_delay()):
+                    attempt = 0
+                else:
+                    attempt += 1
+
         # Timeout reached
-        print(f"Deployment timed out after {DEPLOYMENT_TIMEOUT} seconds ({poll_count} polls)")
+        logger.warning("deployment timed out after %ds (%d polls)",
+                       DEPLOYMENT_TIMEOUT, poll_count)
         return "TIMEOUT", [f"Deployment monitoring timed out after {DEPLOYMENT_TIMEOUT} seconds"], last_deployment_id
+
+    def wait_for_deployment(self, initial_deployment_id=None, use_webhook=True):
+        """Blocking wrapper around wait_for_deployment_async for callers
+        without an event loop (scripts, threads)."""
+        return asyncio.run(
+            self.wait_for_deployment_async(initial_deployment_id, use_webhook)
+        )
     
     def trigger_deployment(self):
         """
         Trigger a new deployment (if Railway doesn't auto-deploy from GitHub).
         Note: Railway typically auto-deploys on push, so this may not be necessary.
         """
-        query = """
-        mutation DeploymentTrigger($projectId: String!) {
-            deploymentTrigger(input: {projectId: $projectId}) {
-                id
-            }
-        }
-        """
-        
         variables = {"projectId": self.project_id}
         
         try:
-            result = self.graphql_query(query, variables)
+            result = self.graphql_query(_TRIGGER_DEPLOYMENT_MUTATION, variables)
             
             if "errors" in result:
                 raise Exception(f"Failed to trigger deployment: {result['errors']}")
@@ -330,12 +689,12 @@ class RailwayManager:
         """Format deployment logs for DeepSeek prompt"""
         if not logs:
             return "No logs available."
-        
-        formatted = []
-        for i, log in enumerate(logs[-100:], 1):  # Last 100 logs
-            formatted.append(f"{i}. {log}")
-        
-        return "\n".join(formatted)
+
+        # Last 100 logs; islice skips to the tail without copying it and
+        # works on deques too, and the join runs over a generator so no
+        # numbered list is ever materialized
+        tail = islice(logs, max(0, len(logs) - 100), None)
+        return "\n".join(f"{i}. {log}" for i, log in enumerate(tail, 1))
     
     def test_connection(self):
         """Test Railway API connection and print diagnostic info"""
@@ -346,30 +705,36 @@ class RailwayManager:
         print(f"API Key length: {len(self.api_key) if self.api_key else 0}")
         
         try:
-            # Test simple query
-            query = """
-            query {
-                me {
-                    id
-                    email
-                }
-            }
-            """
-            result = self.graphql_query(query, {})
+            # Auth check and deployment read share one batched query
+            result = self.graphql_query(_DIAG_QUERY, {"projectId": self.project_id})
+            data = result.get("data") or {}
+
+            me = data.get("me")
+            if not me and result.get("errors"):
+                # A schema-validation failure anywhere in the batched
+                # document nulls the entire response; re-check auth with
+                # the standalone probe before blaming credentials
+                fallback = self.graphql_query(_ME_QUERY, {})
+                me = (fallback.get("data") or {}).get("me")
+            if not me:
+                raise Exception(f"Authentication failed: {result.get('errors')}")
             print("\n✓ API Authentication successful!")
-            if "data" in result and "me" in result["data"]:
-                print(f"Authenticated as: {result['data']['me'].get('email', 'N/A')}")
-            
-            # Try to get project info
+            print(f"Authenticated as: {me.get('email', 'N/A')}")
+
             print("\nTesting project access...")
-            deployment = self.get_latest_deployment()
+            deployment = self._extract_deployment_node(result)
+            if deployment is None and result.get("errors"):
+                # The project section of the batched query didn't resolve
+                # on this schema - fall back to the variant-probing path
+                deployment = self.get_latest_deployment()
+
             if deployment:
                 print(f"✓ Successfully accessed project deployments!")
-                print(f"Latest deployment: {deployment['id']}")
-                print(f"Status: {deployment['status']}")
+                print(f"Latest deployment: {deployment.id}")
+                print(f"Status: {deployment.status}")
             else:
                 print("⚠ No deployments found (this is OK if project is new)")
-                
+
         except Exception as e:
             print(f"\n✗ Connection test failed: {str(e)}")
             import traceback
@@ -31,13 +31,13 @@ def main():
     try:
         deployment = railway.get_latest_deployment()
         if deployment:
-            print(f"✓ Found deployment: {deployment['id']}")
-            print(f"  Status: {deployment['status']}")
-            print(f"  Created: {deployment.get('createdAt', 'N/A')}")
-            
+            print(f"✓ Found deployment: {deployment.id}")
+            print(f"  Status: {deployment.status}")
+            print(f"  Created: {deployment.created_at or 'N/A'}")
+
             # Try to get logs
             print("\n4. Fetching deployment logs...")
-            logs = railway.get_deployment_logs(deployment['id'])
+            logs = railway.get_deployment_logs(deployment.id)
             if logs:
                 print(f"✓ Retrieved {len(logs)} log entries")
                 print("\nFirst 5 log entries:")